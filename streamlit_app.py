@@ -3,7 +3,9 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from utils import calculations
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from utils import calculations, reporting
 import io
 
 # --- Page Config & Styling ---
@@ -26,6 +28,70 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- Cached Computation ---
+# Streamlit reruns the whole script on every interaction, so memoize the heavy steps.
+# st.cache_data only samples the rows of large DataFrames, so key on every row instead;
+# otherwise a re-uploaded file that fixes one row would get the old results back
+FRAME_HASH = {pd.DataFrame: calculations.frame_hash}
+# Uploads stay in process memory only while cached: keep a few recent ones, for an hour
+CACHE_MAX_ENTRIES = 8
+CACHE_TTL = "1h"
+
+@st.cache_data(show_spinner=False, max_entries=1, ttl=CACHE_TTL)
+def load_sample_data():
+    return calculations.generate_sample_data()
+
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def run_analysis(sales, inventory, marketing, logistics):
+    return calculations.process_data(sales, inventory, marketing, logistics)
+
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def to_csv_bytes(df):
+    # Render dates the way to_csv does ('2024-01-01', not '2024-01-01 00:00:00.000000')
+    date_cols = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+    df = df.assign(**{col: df[col].astype(str) for col in date_cols})
+    try:
+        # Arrow writes the column buffers straight to UTF-8 bytes
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns from uploads: let pandas stringify them
+        return df.to_csv(index=False).encode('utf-8')
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(table, buf)
+    return buf.getvalue().to_pybytes()
+
+# --- Cached Charts ---
+# Figures are rebuilt only when their inputs change; tab switches reuse them
+@st.cache_resource(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def build_waterfall(rev, returns_val, cogs, logistics_cost, mkt_spend):
+    return go.Figure(go.Waterfall(
+        measure = ["relative", "relative", "subtotal", "relative", "relative", "relative", "total"],
+        x = ["Gross Revenue", "Returns", "Net Sales", "COGS", "Fulfillment", "Marketing", "Contribution Profit"],
+        y = [rev, returns_val, 0, cogs, logistics_cost, mkt_spend, 0],
+        connector = {"line":{"color":"rgb(63, 63, 63)"}},
+        decreasing = {"marker":{"color":"#EF553B"}},
+        increasing = {"marker":{"color":"#00CC96"}},
+        totals = {"marker":{"color":"#636EFA"}}
+    ))
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def build_trend(channel_metrics):
+    # If marketing spend exists, need to subtract it month-wise. Complicated if not perfectly aligned, but we have channel_metrics
+    m_trend = channel_metrics.groupby('Month')[['Revenue', 'Spend', 'Contribution_Profit_2']].sum().reset_index()
+    return px.line(m_trend, x='Month', y=['Revenue', 'Contribution_Profit_2', 'Spend'], 
+                   title="Revenue vs Contribution Profit vs Spend",
+                   color_discrete_map={"Revenue": "#636EFA", "Contribution_Profit_2": "#00CC96", "Spend": "#EF553B"})
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def build_channel_bar(channel_metrics):
+    return px.bar(channel_metrics, x='Channel', y='CM_Pct', color='Channel', 
+                  title="Higher is Better", text_auto='.1%')
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def build_roas_scatter(channel_metrics):
+    return px.scatter(channel_metrics, x='Spend', y='ROAS', size='Revenue', color='Channel',
+                      hover_name='Channel', title="Bubble Size = Revenue")
+
 # --- Header ---
 st.title("Mahanka Unit Economics Calculator")
 st.markdown("**Discover Your True Profitability Per SKU & Channel – Free Tool for Indian D2C Brands 🇮🇳**")
@@ -42,7 +108,7 @@ with st.sidebar:
     # 1. Option: Load Sample Data
     st.caption("New here? Try with realistic data:")
     if st.button("🚀 Load D2C Sample Data", type="primary", use_container_width=True):
-        sample_data = calculations.generate_sample_data()
+        sample_data = load_sample_data()
         st.session_state['sales_df'] = sample_data['Sales']
         st.session_state['inventory_df'] = sample_data['Inventory']
         st.session_state['marketing_df'] = sample_data['Marketing']
@@ -60,11 +126,11 @@ with st.sidebar:
     logistics_file = st.file_uploader("4. Logistics/Other (Optional)", type=['csv'], help="Columns: Order_ID, Fulfillment_Cost")
 
     if sales_file:
-        st.session_state['sales_df'] = pd.read_csv(sales_file)
+        st.session_state['sales_df'] = calculations.clean_dataframe(pd.read_csv(sales_file))
         st.session_state['data_source'] = 'upload'
-        if inventory_file: st.session_state['inventory_df'] = pd.read_csv(inventory_file)
-        if marketing_file: st.session_state['marketing_df'] = pd.read_csv(marketing_file)
-        if logistics_file: st.session_state['logistics_df'] = pd.read_csv(logistics_file)
+        if inventory_file: st.session_state['inventory_df'] = calculations.clean_dataframe(pd.read_csv(inventory_file))
+        if marketing_file: st.session_state['marketing_df'] = calculations.clean_dataframe(pd.read_csv(marketing_file))
+        if logistics_file: st.session_state['logistics_df'] = calculations.clean_dataframe(pd.read_csv(logistics_file))
 
 # --- Main Logic ---
 if 'sales_df' in st.session_state and st.session_state['sales_df'] is not None:
@@ -76,7 +142,7 @@ if 'sales_df' in st.session_state and st.session_state['sales_df'] is not None:
     
     # Process Data
     try:
-        merged_df, channel_metrics, overall_kpis = calculations.process_data(sales, inventory, marketing, logistics)
+        merged_df, channel_metrics, overall_kpis = run_analysis(sales, inventory, marketing, logistics)
         
         # --- Top Summary Cards ---
         c1, c2, c3, c4, c5 = st.columns(5)
@@ -107,44 +173,27 @@ if 'sales_df' in st.session_state and st.session_state['sales_df'] is not None:
             # Waterfall Calculation
             rev = overall_kpis['Gross_Revenue']
             returns_val = -(overall_kpis['Gross_Revenue'] - overall_kpis['Net_Revenue'])
-            cogs = -merged_df['Total_COGS'].sum()
-            logistics_cost = -merged_df['Fulfillment_Cost'].sum()
+            cogs = -overall_kpis['Total_COGS_Sum']
+            logistics_cost = -overall_kpis['Total_Fulfillment_Sum']
             mkt_spend = -overall_kpis['Total_Spend']
             
-            fig_waterfall = go.Figure(go.Waterfall(
-                measure = ["relative", "relative", "subtotal", "relative", "relative", "relative", "total"],
-                x = ["Gross Revenue", "Returns", "Net Sales", "COGS", "Fulfillment", "Marketing", "Contribution Profit"],
-                y = [rev, returns_val, 0, cogs, logistics_cost, mkt_spend, 0],
-                connector = {"line":{"color":"rgb(63, 63, 63)"}},
-                decreasing = {"marker":{"color":"#EF553B"}},
-                increasing = {"marker":{"color":"#00CC96"}},
-                totals = {"marker":{"color":"#636EFA"}}
-            ))
+            fig_waterfall = build_waterfall(rev, returns_val, cogs, logistics_cost, mkt_spend)
             st.plotly_chart(fig_waterfall, use_container_width=True)
             
             st.markdown("#### Monthly Profit Trend")
-            # Group merged_df by Month
-            monthly = merged_df.groupby('Month')[['Revenue', 'Contribution_Profit_1']].sum().reset_index()
-            # If marketing spend exists, need to subtract it month-wise. Complicated if not perfectly aligned, but we have channel_metrics
-            m_trend = channel_metrics.groupby('Month')[['Revenue', 'Spend', 'Contribution_Profit_2']].sum().reset_index()
-            
-            fig_trend = px.line(m_trend, x='Month', y=['Revenue', 'Contribution_Profit_2', 'Spend'], 
-                                title="Revenue vs Contribution Profit vs Spend",
-                                color_discrete_map={"Revenue": "#636EFA", "Contribution_Profit_2": "#00CC96", "Spend": "#EF553B"})
+            fig_trend = build_trend(channel_metrics)
             st.plotly_chart(fig_trend, use_container_width=True)
 
         with tab2:
             c_col1, c_col2 = st.columns(2)
             with c_col1:
                 st.subheader("Contribution Margin % by Channel")
-                fig_bar = px.bar(channel_metrics, x='Channel', y='CM_Pct', color='Channel', 
-                                 title="Higher is Better", text_auto='.1%')
+                fig_bar = build_channel_bar(channel_metrics)
                 st.plotly_chart(fig_bar, use_container_width=True)
             
             with c_col2:
                 st.subheader("ROAS vs Scale")
-                fig_scat = px.scatter(channel_metrics, x='Spend', y='ROAS', size='Revenue', color='Channel',
-                                      hover_name='Channel', title="Bubble Size = Revenue")
+                fig_scat = build_roas_scatter(channel_metrics)
                 st.plotly_chart(fig_scat, use_container_width=True)
                 
             st.dataframe(channel_metrics.style.format({
@@ -155,13 +204,17 @@ if 'sales_df' in st.session_state and st.session_state['sales_df'] is not None:
         with tab3:
             st.subheader("Top Performers & Bleeders")
             # Group by SKU
-            sku_group = merged_df.groupby('SKU').agg({
-                'Net_Revenue': 'sum',
-                'Units_Sold': 'sum',
-                'Gross_Profit': 'sum',
-                'Contribution_Profit_1': 'sum' # Pre-marketing
-            }).reset_index()
-            sku_group['Gross_Margin_%'] = np.where(sku_group['Net_Revenue']>0, sku_group['Gross_Profit'] / sku_group['Net_Revenue'], 0)
+            # Unsorted: both tables below re-sort for their top 5 anyway
+            # Sum the float32 row-level money columns in float64, like the channel totals
+            sku_cols = ['Net_Revenue', 'Units_Sold', 'Gross_Profit', 'Contribution_Profit_1']
+            sku_frame = merged_df[['SKU', *sku_cols]].astype({col: np.float64 for col in sku_cols if merged_df[col].dtype == np.float32})
+            sku_group = sku_frame.groupby('SKU', observed=True, sort=False).agg(
+                Net_Revenue=('Net_Revenue', 'sum'),
+                Units_Sold=('Units_Sold', 'sum'),
+                Gross_Profit=('Gross_Profit', 'sum'),
+                Contribution_Profit_1=('Contribution_Profit_1', 'sum') # Pre-marketing
+            ).reset_index()
+            sku_group['Gross_Margin_%'] = calculations.safe_div(sku_group['Gross_Profit'], sku_group['Net_Revenue'])
             
             col_sku1, col_sku2 = st.columns(2)
             with col_sku1:
@@ -186,7 +239,6 @@ if 'sales_df' in st.session_state and st.session_state['sales_df'] is not None:
         # --- Report Generation ---
         st.markdown("---")
         st.markdown("### 📥 Export Analysis")
-        from utils import reporting
         
         col_export1, col_export2 = st.columns(2)
         
@@ -210,7 +262,7 @@ if 'sales_df' in st.session_state and st.session_state['sales_df'] is not None:
             
         with col_export2:
             # CSV Download
-            csv_data = merged_df.to_csv(index=False).encode('utf-8')
+            csv_data = to_csv_bytes(merged_df)
             st.download_button(
                 label="📊 Download Detailed Data (CSV)",
                 data=csv_data,
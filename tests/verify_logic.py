@@ -1,5 +1,6 @@
 import sys
 import os
+import io
 import pandas as pd
 import numpy as np
 
@@ -69,9 +70,189 @@ def test_returns_logic():
     else:
         print("⚠️ Warning: Return Rate is 0% (unlikely with this sample logic).")
 
+def test_timezone_months():
+    print("\n🕒 Verifying timezone-aware order dates...")
+    
+    # Shopify-style export: local time with a +05:30 offset
+    sales = pd.DataFrame({
+        'Order_Date': ['2024-01-15 10:00:00 +0530', '2024-02-01 01:00:00 +0530', '2024-02-10 12:00:00 +0530'],
+        'Order_ID': ['A1', 'A2', 'A3'],
+        'SKU': ['SKU1', 'SKU1', 'SKU1'],
+        'Channel': ['Website', 'Website', 'Website'],
+        'Units_Sold': [1, 1, 1],
+        'Revenue': [500.0, 500.0, 500.0]
+    })
+    inventory = pd.DataFrame({'SKU': ['SKU1'], 'Cost_Price': [100.0]})
+    marketing = pd.DataFrame({'Date': ['2024-02-01'], 'Channel': ['Website'], 'Spend': [50.0]})
+    
+    merged_df, channel_metrics, _ = calculations.process_data(sales, inventory, marketing, None)
+    
+    # 01:00 IST on Feb 1 is still Jan 31 in UTC; it must count in February
+    feb_order = merged_df[merged_df['Order_ID'] == 'A2'].iloc[0]
+    assert feb_order['Month'] == pd.Timestamp('2024-02-01'), f"Error: Expected February month, got {feb_order['Month']}"
+    
+    feb = channel_metrics[channel_metrics['Month'] == pd.Timestamp('2024-02-01')].iloc[0]
+    assert feb['Order_ID'] == 2, f"Error: Expected 2 February orders, got {feb['Order_ID']}"
+    assert abs(feb['CAC'] - 25.0) < 0.01, f"Error: Expected February CAC 25.0, got {feb['CAC']}"
+    
+    print("✅ Test Passed: Orders are bucketed by their local month.")
+
+def test_overlapping_columns():
+    print("\n🧩 Verifying uploads that repeat sales columns...")
+    
+    data = calculations.generate_sample_data()
+    sales = data['Sales']
+    inventory = data['Inventory'].assign(Channel='Warehouse')
+    logistics = data['Logistics'].assign(Order_Date=pd.Timestamp('2024-06-30'))
+    
+    merged_df, _, overall_kpis = calculations.process_data(sales, inventory, data['Marketing'], logistics)
+    
+    # Sales values win; the uploaded copies are kept under a suffix
+    assert (merged_df['Order_Date'].values == sales['Order_Date'].values).all(), "Error: Sales Order_Date was overwritten"
+    assert 'Order_Date_Logistics' in merged_df.columns, "Error: Logistics Order_Date was dropped"
+    assert 'Channel_Inventory' in merged_df.columns, "Error: Inventory Channel was dropped"
+    assert overall_kpis['Total_Orders'] == len(sales), "Error: Order count changed with overlapping columns"
+    
+    print("✅ Test Passed: Overlapping columns are suffixed instead of failing the join.")
+
+def test_bool_return_upload():
+    print("\n📄 Verifying an uploaded logistics CSV with True/blank/False returns...")
+    
+    # Blank cells make read_csv keep Is_Return as an object column of bools and NaN
+    sales = pd.read_csv(io.StringIO(
+        "Order_Date,Order_ID,SKU,Channel,Units_Sold,Revenue\n"
+        "2024-01-05,1,SKU1,Website,1,500\n"
+        "2024-01-06,2,SKU1,Website,1,500\n"
+        "2024-01-07,3,SKU1,Amazon,1,500\n"
+    ))
+    inventory = pd.read_csv(io.StringIO("SKU,Cost_Price\nSKU1,100\n"))
+    logistics = pd.read_csv(io.StringIO(
+        "Order_ID,Fulfillment_Cost,Is_Return,Return_Reason\n"
+        "1,80,True,Size Issue\n"
+        "2,80,,\n"
+        "3,80,False,\n"
+    ))
+    sales, inventory, logistics = (calculations.clean_dataframe(df) for df in (sales, inventory, logistics))
+    assert logistics['Return_Reason'].dtype == 'string[pyarrow]', "Error: Text column was not stored as Arrow strings"
+    
+    merged_df, _, overall_kpis = calculations.process_data(sales, inventory, None, logistics)
+    
+    assert merged_df['Is_Return'].tolist() == [1, 0, 0], f"Error: Expected returns [1, 0, 0], got {merged_df['Is_Return'].tolist()}"
+    assert overall_kpis['Net_Revenue'] == 1000, f"Error: Expected Net Revenue 1000, got {overall_kpis['Net_Revenue']}"
+    
+    print("✅ Test Passed: Boolean return flags with blanks survive the upload cleanup.")
+
+def test_channel_month_aggregation():
+    print("\n🧮 Verifying both channel/month aggregation paths...")
+    
+    data = calculations.generate_sample_data()
+    merged_df, _, _ = calculations.process_data(data['Sales'], data['Inventory'], data['Marketing'], data['Logistics'])
+    
+    # Rows with a null key must be dropped by both paths
+    merged_df.loc[merged_df.index[0], 'Channel'] = None
+    merged_df.loc[merged_df.index[1], 'Month'] = pd.NaT
+    
+    expected = merged_df.groupby(['Channel', 'Month'], observed=True).agg({
+        'Revenue': 'sum',
+        'Net_Revenue': 'sum',
+        'Total_COGS': 'sum',
+        'Fulfillment_Cost': 'sum',
+        'Contribution_Profit_1': 'sum',
+        'Units_Sold': 'sum',
+        'Order_ID': 'count',
+        'Is_Return': 'sum'
+    }).rename(columns={'Is_Return': 'Return_Count'})
+    
+    default_threshold = calculations.ARROW_GROUPBY_MIN_ROWS
+    try:
+        for threshold, path in [(0, 'Arrow'), (10**9, 'pandas')]:
+            calculations.ARROW_GROUPBY_MIN_ROWS = threshold
+            result = calculations.aggregate_channel_month(merged_df)
+            pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False, check_categorical=False, rtol=1e-5)
+            print(f"  {path} path matches groupby ({len(result)} groups)")
+    finally:
+        calculations.ARROW_GROUPBY_MIN_ROWS = default_threshold
+    
+    print("✅ Test Passed: Arrow and pandas aggregations agree, null keys dropped.")
+
+def test_crore_scale_totals():
+    print("\n💰 Verifying headline totals on a crore-scale upload...")
+    
+    # ~190k orders worth ~₹290 crore: float32 running sums drift by hundreds of rupees
+    rng = np.random.default_rng(0)
+    n = 190_000
+    sales = pd.DataFrame({
+        'Order_Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'Order_ID': np.arange(n),
+        'SKU': rng.choice(['SKU1', 'SKU2', 'SKU3'], n),
+        'Channel': rng.choice(['Website', 'Amazon'], n),
+        'Units_Sold': rng.integers(1, 4, n),
+        'Revenue': rng.uniform(500, 30000, n).round(2)
+    })
+    inventory = pd.DataFrame({'SKU': ['SKU1', 'SKU2', 'SKU3'], 'Cost_Price': [111.11, 222.22, 333.33]})
+    logistics = pd.DataFrame({
+        'Order_ID': np.arange(n),
+        'Fulfillment_Cost': rng.uniform(40, 120, n).round(2),
+        'Is_Return': (rng.random(n) < 0.1).astype(int)
+    })
+    
+    default_threshold = calculations.ARROW_GROUPBY_MIN_ROWS
+    try:
+        for threshold, path in [(0, 'Arrow'), (10**9, 'pandas')]:
+            calculations.ARROW_GROUPBY_MIN_ROWS = threshold
+            merged_df, _, overall_kpis = calculations.process_data(sales, inventory, None, logistics)
+            for kpi, col in [('Gross_Revenue', 'Revenue'), ('Net_Revenue', 'Net_Revenue'), ('Net_Profit', 'Contribution_Profit_1')]:
+                # Row values stay float32; only the totals must be summed in float64
+                expected = merged_df[col].astype(np.float64).sum()
+                assert abs(overall_kpis[kpi] - expected) < 0.5, f"Error: {path} {kpi} off by ₹{overall_kpis[kpi] - expected:,.2f}"
+            print(f"  {path} path totals exact to the rupee")
+    finally:
+        calculations.ARROW_GROUPBY_MIN_ROWS = default_threshold
+    
+    print("✅ Test Passed: Headline totals accumulate in float64.")
+
+def test_payback_vec():
+    print("\n⏳ Verifying vectorized payback...")
+    
+    payback = calculations.calculate_payback_vec([10, 20, 5], [2, 0, -1])
+    expected = [calculations.calculate_payback(c, m) for c, m in zip([10, 20, 5], [2, 0, -1])]
+    
+    # Zero or negative margin never pays back
+    assert np.allclose(payback, [5, 999, 999]), f"Error: Expected [5, 999, 999], got {payback}"
+    assert np.allclose(payback, expected), f"Error: Vectorized payback {payback} disagrees with scalar {expected}"
+    
+    print("✅ Test Passed: Vectorized payback matches the scalar version.")
+
+def test_frame_hash():
+    print("\n🔑 Verifying cache keys on large uploads...")
+    
+    # Above 50k rows st.cache_data hashes only a row sample; frame_hash must see every row
+    rng = np.random.default_rng(1)
+    n = 150_000
+    sales = pd.DataFrame({
+        'Order_ID': np.arange(n),
+        'Channel': pd.Categorical(rng.choice(['Website', 'Amazon'], n)),
+        'Revenue': rng.uniform(500, 3000, n).round(2)
+    })
+    corrected = sales.copy()
+    corrected.loc[n // 3, 'Revenue'] += 1
+    
+    assert calculations.frame_hash(sales) == calculations.frame_hash(sales.copy()), "Error: Identical uploads hash differently"
+    assert calculations.frame_hash(sales) != calculations.frame_hash(corrected), "Error: One-row correction kept the same cache key"
+    assert calculations.frame_hash(sales) != calculations.frame_hash(sales.rename(columns={'Revenue': 'Spend'})), "Error: Renamed column kept the same cache key"
+    
+    print("✅ Test Passed: A one-row change gives a new cache key.")
+
 if __name__ == "__main__":
     try:
         test_returns_logic()
+        test_timezone_months()
+        test_overlapping_columns()
+        test_bool_return_upload()
+        test_channel_month_aggregation()
+        test_crore_scale_totals()
+        test_payback_vec()
+        test_frame_hash()
         print("\n🎉 ALL TESTS PASSED")
     except AssertionError as e:
         print(f"\n❌ TEST FAILED: {str(e)}")
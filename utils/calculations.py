@@ -1,16 +1,18 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import datetime
+import hashlib
 
 def generate_sample_data():
     """Generates realistic sample data for D2C unit economics analysis."""
-    np.random.seed(42)
+    rng = np.random.default_rng(42)
     
     # 1. SKUs and Inventory (COGS)
     skus = [f'TSHIRT_{c}_{sz}' for c in ['BLK', 'WHT', 'NVY'] for sz in ['S', 'M', 'L', 'XL']]
     inventory_data = {
         'SKU': skus,
-        'Cost_Price': np.random.uniform(150, 450, len(skus)).round(2)  # INR
+        'Cost_Price': rng.uniform(150, 450, len(skus)).round(2).astype(np.float32)  # INR
     }
     inventory_df = pd.DataFrame(inventory_data)
     
@@ -18,33 +20,30 @@ def generate_sample_data():
     dates = pd.date_range(start='2024-01-01', end='2024-03-31', freq='D')
     channels = ['Website', 'Amazon', 'Instagram', 'Myntra']
     
-    sales_records = []
-    order_id_counter = 1000
+    # Random daily orders, then every order attribute drawn as one batch
+    num_orders = rng.poisson(np.where(dates.month == 1, 15, 25))
+    n = num_orders.sum()
     
-    for d in dates:
-        # Random daily orders
-        num_orders = np.random.poisson(15 if d.month == 1 else 25) 
-        for _ in range(num_orders):
-            channel = np.random.choice(channels, p=[0.4, 0.3, 0.2, 0.1])
-            sku = np.random.choice(skus)
-            qty = np.random.choice([1, 1, 1, 2, 3])
-            price_base = inventory_df.loc[inventory_df['SKU'] == sku, 'Cost_Price'].values[0] * np.random.uniform(2.5, 4.0)
-            
-            # Channel adjustments
-            if channel == 'Amazon': price_base *= 0.9 # Competitive pricing
-            
-            sales_records.append({
-                'Order_Date': d,
-                'Order_ID': f'ORD-{order_id_counter}',
-                'SKU': sku,
-                'Channel': channel,
-                'Units_Sold': qty,
-                'Revenue': round(price_base * qty, 2),
-                'Customer_ID': f'CUST-{np.random.randint(1, 500)}' # Some repeat customers
-            })
-            order_id_counter += 1
-            
-    sales_df = pd.DataFrame(sales_records)
+    # Draw integer positions so cost lookup is a plain array index
+    channel_idx = rng.choice(len(channels), size=n, p=[0.4, 0.3, 0.2, 0.1])
+    sku_idx = rng.integers(0, len(skus), n)
+    qty_col = rng.choice([1, 1, 1, 2, 3], size=n)
+    # Categorical columns straight from the codes; no per-row string objects
+    channel_col = pd.Categorical.from_codes(channel_idx, channels)
+    sku_col = pd.Categorical.from_codes(sku_idx, skus)
+    
+    price = inventory_df['Cost_Price'].to_numpy()[sku_idx] * rng.uniform(2.5, 4.0, n)
+    price[channel_col == 'Amazon'] *= 0.9 # Competitive pricing
+    
+    sales_df = pd.DataFrame({
+        'Order_Date': np.repeat(dates.values, num_orders),
+        'Order_ID': np.arange(1000, 1000 + n, dtype=np.int32),
+        'SKU': sku_col,
+        'Channel': channel_col,
+        'Units_Sold': qty_col.astype(np.int16),
+        'Revenue': np.round(price * qty_col, 2).astype(np.float32),
+        'Customer_ID': rng.integers(1, 500, n, dtype=np.int32) # Some repeat customers
+    })
     
     # 3. Marketing Spend (Monthly/Channel)
     marketing_records = []
@@ -55,7 +54,7 @@ def generate_sample_data():
             base_spend = 50000 if ch == 'Website' else 30000
             if ch == 'Instagram': base_spend = 80000
             
-            spend = base_spend * np.random.uniform(0.8, 1.2)
+            spend = base_spend * rng.uniform(0.8, 1.2)
             marketing_records.append({
                 'Date': pd.Timestamp(f'2024-{m:02d}-01'),
                 'Channel': ch,
@@ -64,28 +63,20 @@ def generate_sample_data():
     marketing_df = pd.DataFrame(marketing_records)
 
     # 4. Logistics/Other (Order Level) with RETURNS
-    logistics_records = []
-    for _, row in sales_df.iterrows():
-        order_id = row['Order_ID']
-        channel = row['Channel']
-        
-        # Random logic: Amazon FBA vs Self Ship
-        shipping = np.random.choice([60, 80, 120])
-        
-        # Returns Logic (Higher returns for marketplaces)
-        return_prob = 0.15 # Base
-        if channel == 'Myntra': return_prob = 0.30
-        if channel == 'Amazon': return_prob = 0.25
-        
-        is_return = 1 if np.random.random() < return_prob else 0
-        
-        logistics_records.append({
-            'Order_ID': order_id,
-            'Fulfillment_Cost': shipping,
-            'Is_Return': is_return,
-            'Return_Reason': np.random.choice(['Size', 'Quality', 'Changed Mind']) if is_return else None
-        })
-    logistics_df = pd.DataFrame(logistics_records)
+    # Random logic: Amazon FBA vs Self Ship
+    shipping = rng.choice([60, 80, 120], size=n)
+    
+    # Returns Logic (Higher returns for marketplaces, 15% base)
+    return_prob = np.select([channel_col == 'Myntra', channel_col == 'Amazon'], [0.30, 0.25], default=0.15)
+    is_return = (rng.random(n) < return_prob).astype(np.int8)
+    return_reason = pd.array(np.where(is_return == 1, rng.choice(['Size', 'Quality', 'Changed Mind'], size=n), None), dtype='string[pyarrow]')
+    
+    logistics_df = pd.DataFrame({
+        'Order_ID': sales_df['Order_ID'].values,
+        'Fulfillment_Cost': shipping.astype(np.float32),
+        'Is_Return': is_return,
+        'Return_Reason': return_reason
+    })
     
     return {
         'Sales': sales_df,
@@ -95,13 +86,72 @@ def generate_sample_data():
     }
 
 def clean_dataframe(df):
-    """Standardize column names to lowercase/stripped for easier matching."""
+    """Strip whitespace from column names for easier matching; text columns become Arrow strings."""
     if df is None: return None
     df = df.copy()
     # Basic cleanup: strip whitespace from headers
     df.columns = df.columns.astype(str).str.strip()
+    # Text columns on Arrow-backed strings instead of Python objects.
+    # Only columns that really hold text: object columns of bools/numbers with blanks stay as-is
+    text_cols = [col for col in df.select_dtypes(include=['object', 'string']).columns
+                 if pd.api.types.infer_dtype(df[col], skipna=True) in ('string', 'empty')]
+    df[text_cols] = df[text_cols].astype('string[pyarrow]')
     return df
 
+def frame_hash(df):
+    """Hash every row of a DataFrame plus its column names and dtypes, for keying caches."""
+    header = '|'.join(f'{col}:{dtype}' for col, dtype in df.dtypes.items())
+    rows = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha256(header.encode() + rows.tobytes()).digest()
+
+def safe_div(num, denom):
+    """Elementwise num / denom, returning 0 wherever denom is not positive."""
+    num = np.asarray(num, dtype=float)
+    denom = np.asarray(denom, dtype=float)
+    out = np.zeros(len(num))
+    np.divide(num, denom, out=out, where=denom > 0)
+    return out
+
+def month_start(dates):
+    """Truncate a datetime Series to the first day of each month."""
+    if dates.dt.tz is not None:
+        # Keep the local wall-clock month; NumPy would truncate in UTC
+        dates = dates.dt.tz_localize(None)
+    # NumPy month truncation on the int64 values, no Period objects involved
+    return pd.Series(dates.to_numpy().astype('datetime64[M]'), index=dates.index)
+
+# Above this many rows the channel/month aggregation runs on Arrow
+ARROW_GROUPBY_MIN_ROWS = 200_000
+
+def aggregate_channel_month(merged_df):
+    """Sum order-level metrics per Channel and Month, indexed by (Channel, Month)."""
+    agg = {
+        'Revenue': 'sum', # Gross Revenue
+        'Net_Revenue': 'sum',
+        'Total_COGS': 'sum',
+        'Fulfillment_Cost': 'sum',
+        'Contribution_Profit_1': 'sum',
+        'Units_Sold': 'sum',
+        'Order_ID': 'count', # One row per order (see process_data)
+        'Is_Return': 'sum'
+    }
+    # Row-level money columns are float32; accumulate the sums in float64 so
+    # crore-scale totals stay exact to the rupee on both paths
+    frame = merged_df[['Channel', 'Month', *agg]]
+    frame = frame.astype({col: np.float64 for col in agg if frame[col].dtype == np.float32})
+    if len(frame) <= ARROW_GROUPBY_MIN_ROWS:
+        channel_group = frame.groupby(['Channel', 'Month'], observed=True).agg(agg)
+        return channel_group.rename(columns={'Is_Return': 'Return_Count'})
+    
+    # Large uploads: Arrow's hash aggregation on the dictionary-encoded Channel
+    tbl = pa.Table.from_pandas(frame, preserve_index=False)
+    channel_group = tbl.group_by(['Channel', 'Month']).aggregate(list(agg.items())).to_pandas()
+    channel_group = channel_group.rename(columns={f'{col}_{how}': col for col, how in agg.items()})
+    # Match pandas: drop null keys and sort by key
+    channel_group = channel_group.dropna(subset=['Channel', 'Month']).sort_values(['Channel', 'Month'])
+    channel_group = channel_group.set_index(['Channel', 'Month'])[list(agg)]
+    return channel_group.rename(columns={'Is_Return': 'Return_Count'})
+
 def process_data(sales, inventory, marketing, logistics):
     """
     Core logic to merge and calculate unit economics.
@@ -109,15 +159,27 @@ def process_data(sales, inventory, marketing, logistics):
         - merged_df: Granular Sales + COGS + Logistics
         - channel_metrics: Aggregated by Channel/Month with Marketing info
         - overall_metrics: Dictionary of scalar KPIs
+    Sales is expected at one row per order, so orders are counted per row.
     """
     # 1. Pre-process Sales
     sales = sales.copy()
-    sales['Order_Date'] = pd.to_datetime(sales['Order_Date'])
-    sales['Month'] = sales['Order_Date'].dt.to_period('M').dt.to_timestamp()
+    if not pd.api.types.is_datetime64_any_dtype(sales['Order_Date']):
+        sales['Order_Date'] = pd.to_datetime(sales['Order_Date'])
+    sales['Month'] = month_start(sales['Order_Date'])
+    # Categorical keys: groupbys hash small integer codes instead of strings.
+    # Skip columns that already are: re-casting hands back read-only codes
+    for col in ['Channel', 'SKU']:
+        if not isinstance(sales[col].dtype, pd.CategoricalDtype):
+            sales[col] = sales[col].astype('category')
     
     # 2. Merge Inventory (COGS)
-    # Try merging on SKU
-    merged_df = pd.merge(sales, inventory, on='SKU', how='left')
+    # Give both sides the same SKU categories so the join matches on codes
+    skus = sales['SKU'].cat.categories.union(pd.Index(inventory['SKU'].dropna().unique()))
+    sales['SKU'] = sales['SKU'].cat.set_categories(skus)
+    inventory = inventory.astype({'SKU': sales['SKU'].dtype})
+    # Left-join on SKU against the inventory indexed by SKU
+    # Overlapping non-key columns keep the sales value; inventory's copy gets a suffix
+    merged_df = sales.join(inventory.set_index('SKU'), on='SKU', rsuffix='_Inventory')
     
     # Calculate Total COGS
     if 'Cost_Price' in merged_df.columns:
@@ -133,18 +195,21 @@ def process_data(sales, inventory, marketing, logistics):
     # 3. Merge Logistics and Handle RETURNS
     if logistics is not None:
         if 'Order_ID' in logistics.columns and 'Order_ID' in merged_df.columns:
-            merged_df = pd.merge(merged_df, logistics, on='Order_ID', how='left')
-            merged_df['Fulfillment_Cost'] = merged_df['Fulfillment_Cost'].fillna(0)
+            merged_df = merged_df.join(logistics.set_index('Order_ID'), on='Order_ID', rsuffix='_Logistics')
+            # Fill only when some orders had no logistics row
+            if merged_df['Fulfillment_Cost'].hasnans:
+                merged_df['Fulfillment_Cost'] = merged_df['Fulfillment_Cost'].fillna(0)
             
             # Normalize Return Columns
             if 'Is_Return' not in merged_df.columns:
                 # check for alternate names or derive
                 if 'Return_Status' in merged_df.columns:
-                     merged_df['Is_Return'] = merged_df['Return_Status'].apply(lambda x: 1 if str(x).lower() in ['returned', 'rto', 'return'] else 0)
+                     merged_df['Is_Return'] = merged_df['Return_Status'].astype(str).str.lower().isin(['returned', 'rto', 'return']).astype(np.int8)
                 else:
                      merged_df['Is_Return'] = 0
             
-            merged_df['Is_Return'] = merged_df['Is_Return'].fillna(0).astype(int)
+            if merged_df['Is_Return'].hasnans:
+                merged_df['Is_Return'] = merged_df['Is_Return'].fillna(0)
             
         else:
             merged_df['Fulfillment_Cost'] = 0
@@ -152,65 +217,76 @@ def process_data(sales, inventory, marketing, logistics):
     else:
         merged_df['Fulfillment_Cost'] = 0
         merged_df['Is_Return'] = 0
+    
+    # Narrow dtypes: INR amounts don't need float64, so every later pass moves half the bytes
+    for col in ['Revenue', 'Total_COGS', 'Fulfillment_Cost']:
+        merged_df[col] = merged_df[col].astype(np.float32)
+    merged_df['Units_Sold'] = pd.to_numeric(merged_df['Units_Sold'], downcast='integer')
+    merged_df['Is_Return'] = merged_df['Is_Return'].astype(np.int8)
         
     # --- NET REVENUE CALCULATION ---
+    # Computed on the raw arrays and assigned together so each column is read once
     # Net Revenue = Revenue * (1 - Is_Return) -> Assuming full refund
     # Also handle negative revenue inputs if any
-    merged_df['Net_Revenue'] = np.where(merged_df['Is_Return'] == 1, 0, merged_df['Revenue'])
+    revenue = merged_df['Revenue'].to_numpy()
+    is_return = merged_df['Is_Return'].to_numpy() == 1
+    # No returns (e.g. no logistics file): Net Revenue is just Revenue
+    net_revenue = np.where(is_return, 0.0, revenue) if is_return.any() else revenue
     
     # Gross Profit (Net) = Net_Revenue - COGS (Sunk)
     # Note: User requested COGS is sunk even on returns. 
-    merged_df['Gross_Profit'] = merged_df['Net_Revenue'] - merged_df['Total_COGS']
+    gross_profit = net_revenue - merged_df['Total_COGS'].to_numpy()
     
     # Contribution Margin 1 (Net) = Gross Profit - Fulfillment (Sunk)
-    merged_df['Contribution_Profit_1'] = merged_df['Gross_Profit'] - merged_df['Fulfillment_Cost']
+    contribution_1 = gross_profit - merged_df['Fulfillment_Cost'].to_numpy()
+    
+    merged_df = merged_df.assign(Net_Revenue=net_revenue, Gross_Profit=gross_profit, Contribution_Profit_1=contribution_1)
     
     # 4. Aggregations for Marketing (CM2)
     # Group by Channel and Month
-    channel_group = merged_df.groupby(['Channel', 'Month']).agg({
-        'Revenue': 'sum', # Gross Revenue
-        'Net_Revenue': 'sum',
-        'Total_COGS': 'sum',
-        'Fulfillment_Cost': 'sum',
-        'Contribution_Profit_1': 'sum',
-        'Units_Sold': 'sum',
-        'Order_ID': 'nunique',
-        'Is_Return': 'sum'
-    }).rename(columns={'Is_Return': 'Return_Count'}).reset_index()
+    channel_group = aggregate_channel_month(merged_df)
     
     # 5. Merge Marketing Spend
     if marketing is not None:
-        marketing['Date'] = pd.to_datetime(marketing['Date'])
-        marketing['Month'] = marketing['Date'].dt.to_period('M').dt.to_timestamp()
+        marketing = marketing.copy()
+        if not pd.api.types.is_datetime64_any_dtype(marketing['Date']):
+            marketing['Date'] = pd.to_datetime(marketing['Date'])
+        marketing['Month'] = month_start(marketing['Date'])
+        marketing['Channel'] = marketing['Channel'].astype('category')
         
         # Aggregate marketing just in case multiple entries per month/channel
-        mkt_agg = marketing.groupby(['Channel', 'Month'])['Spend'].sum().reset_index()
+        mkt_agg = marketing.groupby(['Channel', 'Month'], observed=True)['Spend'].sum()
         
-        channel_metrics = pd.merge(channel_group, mkt_agg, on=['Channel', 'Month'], how='outer').fillna(0)
+        # Both sides are indexed by (Channel, Month); reindex to the union of keys,
+        # filling gaps with 0 directly instead of an outer join + fillna
+        keys = channel_group.index.union(mkt_agg.index)
+        channel_metrics = channel_group.reindex(keys, fill_value=0)
+        channel_metrics['Spend'] = mkt_agg.reindex(keys, fill_value=0)
+        channel_metrics = channel_metrics.reset_index()
     else:
-        channel_metrics = channel_group.copy()
+        channel_metrics = channel_group.reset_index()
         channel_metrics['Spend'] = 0
         
     # 6. Calculate Unit Economics Support Metrics
     channel_metrics['Contribution_Profit_2'] = channel_metrics['Contribution_Profit_1'] - channel_metrics['Spend']
     
     # KPIs
-    channel_metrics['CAC'] = np.where(channel_metrics['Order_ID'] > 0, channel_metrics['Spend'] / channel_metrics['Order_ID'], 0)
+    channel_metrics['CAC'] = safe_div(channel_metrics['Spend'], channel_metrics['Order_ID'])
     
     # ROAS calculated on Gross Revenue usually, but can be Net. Standard is Gross Sales / Spend.
-    channel_metrics['ROAS'] = np.where(channel_metrics['Spend'] > 0, channel_metrics['Revenue'] / channel_metrics['Spend'], 0)
+    channel_metrics['ROAS'] = safe_div(channel_metrics['Revenue'], channel_metrics['Spend'])
     
-    channel_metrics['AOV'] = np.where(channel_metrics['Order_ID'] > 0, channel_metrics['Revenue'] / channel_metrics['Order_ID'], 0)
+    channel_metrics['AOV'] = safe_div(channel_metrics['Revenue'], channel_metrics['Order_ID'])
     
     # Margins based on Net Revenue ideally, but often denomination is Gross. 
     # Let's use Net Revenue denomiator for "Real" margin, or Gross for standard accounting?
     # User asked for "True Profitability". 
     # CM % = Contribution Profit / Net Revenue is most accurate.
     # However, to avoid Div/0 if Net Rev is 0 (all returns), we handle carefully.
-    channel_metrics['CM_Pct'] = np.where(channel_metrics['Net_Revenue'] > 0, channel_metrics['Contribution_Profit_2'] / channel_metrics['Net_Revenue'], 0)
+    channel_metrics['CM_Pct'] = safe_div(channel_metrics['Contribution_Profit_2'], channel_metrics['Net_Revenue'])
     
     # Return Rate
-    channel_metrics['Return_Rate_Pct'] = np.where(channel_metrics['Order_ID'] > 0, channel_metrics['Return_Count'] / channel_metrics['Order_ID'], 0)
+    channel_metrics['Return_Rate_Pct'] = safe_div(channel_metrics['Return_Count'], channel_metrics['Order_ID'])
     
     # 7. Overall Summary
     gross_rev = channel_metrics['Revenue'].sum()
@@ -218,12 +294,16 @@ def process_data(sales, inventory, marketing, logistics):
     total_spend = channel_metrics['Spend'].sum()
     total_orders = channel_metrics['Order_ID'].sum()
     total_margin = channel_metrics['Contribution_Profit_2'].sum()
+    total_cogs = channel_metrics['Total_COGS'].sum()
+    total_fulfillment = channel_metrics['Fulfillment_Cost'].sum()
     
     overall = {
         'Gross_Revenue': gross_rev,
         'Net_Revenue': net_rev,
         'Total_Spend': total_spend,
         'Total_Orders': total_orders,
+        'Total_COGS_Sum': total_cogs,
+        'Total_Fulfillment_Sum': total_fulfillment,
         'Net_Profit': total_margin, # Pre-fixed costs
         'Blended_ROAS': gross_rev / total_spend if total_spend > 0 else 0,
         'Blended_CAC': total_spend / total_orders if total_orders > 0 else 0,
@@ -240,15 +320,16 @@ def calculate_ltv(merged_df):
     if 'Customer_ID' not in merged_df.columns:
         return 0, 0 
         
-    # Group by Customer (Use Net Revenue)
-    cust_group = merged_df.groupby('Customer_ID').agg({
-        'Net_Revenue': 'sum',
-        'Contribution_Profit_1': 'sum', # Gross Profit post-fulfillment
-        'Order_ID': 'nunique'
-    })
+    # Sum per Customer (Use Net Revenue) with bincount over integer codes;
+    # missing IDs get code -1 and are skipped, as groupby would
+    codes, _ = pd.factorize(merged_df['Customer_ID'])
+    valid = codes >= 0
+    codes = codes[valid]
+    cust_revenue = np.bincount(codes, weights=merged_df['Net_Revenue'].fillna(0).to_numpy(dtype=float)[valid])
+    cust_profit = np.bincount(codes, weights=merged_df['Contribution_Profit_1'].fillna(0).to_numpy(dtype=float)[valid]) # Gross Profit post-fulfillment
     
-    avg_customer_revenue = cust_group['Net_Revenue'].mean()
-    avg_customer_profit = cust_group['Contribution_Profit_1'].mean()
+    avg_customer_revenue = cust_revenue.mean()
+    avg_customer_profit = cust_profit.mean()
     
     return avg_customer_revenue, avg_customer_profit
 
@@ -256,3 +337,11 @@ def calculate_payback(cac, margin_per_order, orders_per_month_per_cust=1):
     if margin_per_order <= 0: return 999
     return cac / margin_per_order
 
+def calculate_payback_vec(cac, margin_per_order):
+    """Array version of calculate_payback: 999 wherever the margin is not positive."""
+    cac = np.asarray(cac, dtype=float)
+    margin_per_order = np.asarray(margin_per_order, dtype=float)
+    out = np.full(np.broadcast(cac, margin_per_order).shape, 999.0)
+    np.divide(cac, margin_per_order, out=out, where=margin_per_order > 0)
+    return out
+